@@ -3,10 +3,11 @@ from datetime import datetime
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from fitter import Fitter
 from pathlib import Path
 # import seaborn as sns
-import statsmodels.graphics.gofplots as sm
+import metrics_store
+from validation import validate_data, get_record_rejections, quarantine_folder
+from fit_evaluation import evaluate_fits, plot_qq, plot_pp, plot_best_densities
 
 day_length = 60 * 60 * 24
 resolution = 60 * 30  # resolution of arrival rates in seconds
@@ -19,7 +20,7 @@ pd.options.mode.chained_assignment = None
 
 
 # TODO: change x-axis for nighttime such that it displays the accurate times
-def plot_and_save(data_to_plot, title, x_label, y_label, filename, bins, fit_dist=True):
+def plot_and_save(data_to_plot, title, x_label, y_label, filename, bins, fit_dist=True, scenario=None):
     plt.rcParams.update({'figure.figsize': (7, 5), 'figure.dpi': 100})
     test_data = [(i / (60 * 60)) % 24 for i in data_to_plot]
     folder = 'Distribution_plots/' if fit_dist else 'Images/'
@@ -29,19 +30,18 @@ def plot_and_save(data_to_plot, title, x_label, y_label, filename, bins, fit_dis
         dist_in_both = ["beta", "cauchy", "chi2", "erlang", "expon", "truncexpon", "gamma", "gumbel_l", "gumbel_r",
                         "laplace", "loggamma", "loglaplace", "loguniform", "logistic", "lognorm", "norm", "truncnorm",
                         "pareto", "rayleigh", "triang", "uniform", "weibull_min", "weibull_max"]
-        # fitter = Fitter(data_to_plot, distributions=dist_in_both, timeout=60, bins=bins)
-        sm.ProbPlot(np.array(test_data)).qqplot(line='q', xlabel='theoretical quantiles', ylabel='empirical quantiles')
-        sm.ProbPlot(np.array(test_data)).ppplot(line='s', xlabel='theoretical distribution',
-                                                ylabel='empirical distribution')
-        fitter = Fitter(test_data, distributions=dist_in_both, timeout=60, bins=bins)
-        fitter.fit()
-        fitter.summary(Nbest=3)
-        # save information about distribution fitting in txt file
-        f = open("fitting_distribution_arrivals_data.txt", "a")
-        f.write('*' * 80 + '\n')
-        f.write('fitter info for ' + filename + ':\n')
-        f.write(str(fitter.get_best()) + '\n\n')
-        f.close()
+        # sort once and score all candidates on the same array, QQ/PP plots reuse the computed values
+        evaluation = evaluate_fits(test_data, dist_in_both)
+        if evaluation['ranking']:
+            fig, axs = plt.subplots(1, 2)
+            plot_qq(axs[0], evaluation)
+            plot_pp(axs[1], evaluation)
+            fig.tight_layout()
+            fig.savefig(folder + 'QQ PP ' + filename)
+            plt.close(fig)
+            # save ranked scores of all distributions in metrics store
+            metrics_store.add_fit_ranking('arrival_fit', scenario, 'arrival', evaluation['ranking'])
+        plot_best_densities(plt.gca(), evaluation, bins)
 
     plt.gca().set(title=title, ylabel=y_label, xlabel=x_label)
     plt.savefig(folder + filename)
@@ -87,7 +87,7 @@ def plot_arrivals(df, type_name, bins=24):
     """ plot arrival rate of given dataframe by daytime"""
     df_arrivals = [x for x in df['arrival_time']]
     plot_and_save(df_arrivals, title='Ankunft ' + type_name, y_label='Occurrences', x_label='Uhrzeit[h]',
-                  filename='Ankunft ' + type_name + '.png', bins=bins, fit_dist=True)
+                  filename='Ankunft ' + type_name + '.png', bins=bins, fit_dist=True, scenario=type_name)
 
 
 def analysis(df, time_name, bins=24):
@@ -140,15 +140,24 @@ if __name__ == '__main__':
     # clear output txt files
     open("arrival_rates_data.txt", "w").close()
     open("fitting_distribution_arrivals_data.txt", "w").close()
+    conn = metrics_store.connect()
+    run_id = metrics_store.start_run(conn, 'arrival_dist')
 
     Path("Images/").mkdir(parents=True, exist_ok=True)
     Path("Distribution_plots/").mkdir(parents=True, exist_ok=True)
+    Path(quarantine_folder).mkdir(parents=True, exist_ok=True)
 
     data_frame = pd.read_csv('data.csv', sep=';')
 
     data_frame = cleanup_data(data_frame)
+    # duplicate passengers and unknown types would distort the arrival counts
+    data_frame = validate_data(data_frame, 'data', rules=get_record_rejections)
     data_frame = add_weekly_normed_timestamps(data_frame)
     if get_single_days:
         analysis_single_day(data_frame)
     else:
         analysis_working_day_weekend(data_frame)
+
+    metrics_store.flush(conn, run_id)
+    metrics_store.render_fit_results(conn, run_id, 'arrival_fit', "fitting_distribution_arrivals_data.txt")
+    conn.close()
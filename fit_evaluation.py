@@ -0,0 +1,75 @@
+import numpy as np
+import scipy.stats
+
+# score used to rank the candidate distributions, lower is better for all of them
+ranking_score = 'aic'
+
+
+def get_plotting_positions(n):
+    """ return empirical cumulative probabilities of n sorted values, same as statsmodels ProbPlot """
+    return np.arange(1, n + 1) / (n + 1)
+
+
+def evaluate_distribution(sorted_data, positions, distribution_name):
+    """ fit given scipy distribution and return its KS, Anderson-Darling, AIC and BIC on the sorted data """
+    n = len(sorted_data)
+    distribution = getattr(scipy.stats, distribution_name)
+    params = distribution.fit(sorted_data)
+    frozen = distribution(*params)
+
+    cdf = frozen.cdf(sorted_data)
+    with np.errstate(divide='ignore'):
+        log_likelihood = np.sum(frozen.logpdf(sorted_data))
+    # Kolmogorov-Smirnov, largest gap between fitted and empirical step function
+    steps = np.arange(1, n + 1) / n
+    ks = max(np.max(steps - cdf), np.max(cdf - (steps - 1 / n)))
+    # Anderson-Darling, tails weighted stronger than in KS
+    clipped = np.clip(cdf, 1e-12, 1 - 1e-12)
+    ad = -n - np.mean((2 * np.arange(1, n + 1) - 1) * (np.log(clipped) + np.log(1 - clipped[::-1])))
+
+    return {'distribution': distribution_name, 'params': [float(p) for p in params], 'ks': float(ks),
+            'ad': float(ad), 'aic': float(2 * len(params) - 2 * log_likelihood),
+            'bic': float(len(params) * np.log(n) - 2 * log_likelihood), 'cdf': cdf,
+            'quantiles': frozen.ppf(positions)}
+
+
+def evaluate_fits(data, distributions):
+    """ sort data once, score every candidate distribution on it and return results ranked best first """
+    sorted_data = np.sort(np.asarray(data, dtype=float))
+    positions = get_plotting_positions(len(sorted_data))
+    results = []
+    for distribution_name in distributions:
+        try:
+            results.append(evaluate_distribution(sorted_data, positions, distribution_name))
+        except (ValueError, RuntimeError, FloatingPointError):
+            # distribution can not be fitted to this data
+            continue
+    results.sort(key=lambda result: result[ranking_score] if np.isfinite(result[ranking_score]) else np.inf)
+    return {'sorted': sorted_data, 'positions': positions, 'ranking': results}
+
+
+def plot_qq(ax, evaluation):
+    """ draw QQ plot of the best ranked distribution from precomputed quantiles """
+    best = evaluation['ranking'][0]
+    ax.plot(best['quantiles'], evaluation['sorted'], marker='.', linestyle='none')
+    lower = min(best['quantiles'][0], evaluation['sorted'][0])
+    upper = max(best['quantiles'][-1], evaluation['sorted'][-1])
+    ax.plot([lower, upper], [lower, upper], color='r')
+    ax.set(title='QQ ' + best['distribution'], xlabel='theoretical quantiles', ylabel='empirical quantiles')
+
+
+def plot_pp(ax, evaluation):
+    """ draw PP plot of the best ranked distribution from precomputed cumulative probabilities """
+    best = evaluation['ranking'][0]
+    ax.plot(best['cdf'], evaluation['positions'], marker='.', linestyle='none')
+    ax.plot([0, 1], [0, 1], color='r')
+    ax.set(title='PP ' + best['distribution'], xlabel='theoretical distribution', ylabel='empirical distribution')
+
+
+def plot_best_densities(ax, evaluation, bins, n_best=3):
+    """ draw normed histogram of the data with densities of the n best ranked distributions """
+    ax.hist(evaluation['sorted'], bins=bins, density=True)
+    x = np.linspace(evaluation['sorted'][0], evaluation['sorted'][-1], 1000)
+    for result in evaluation['ranking'][:n_best]:
+        ax.plot(x, getattr(scipy.stats, result['distribution'])(*result['params']).pdf(x), label=result['distribution'])
+    ax.legend()
@@ -0,0 +1,82 @@
+import hashlib
+import json
+from pathlib import Path
+import numpy as np
+
+# computed histograms are kept here, so re-styling or re-rendering never touches the raw passenger data
+cache_folder = 'HistogramCache/'
+
+
+def get_shared_edges(dfs, columns, bins, scale=1):
+    """ return bin edges per column shared by all scenarios, like np.histogram would choose for the stacked data """
+    edges = {}
+    for column in columns:
+        lower = min(dfs[key_element][column].min() for key_element in dfs) / scale
+        upper = max(dfs[key_element][column].max() for key_element in dfs) / scale
+        if lower == upper:
+            # same fallback as np.histogram for data without spread
+            lower, upper = lower - 0.5, upper + 0.5
+        edges[column] = np.linspace(lower, upper, bins + 1)
+    return edges
+
+
+def compute_histograms(dfs, columns, bins, scale=1):
+    """ return counts for every scenario and column computed in one pass per scenario over all columns """
+    edges = get_shared_edges(dfs, columns, bins, scale)
+    lowers = np.array([edges[column][0] for column in columns])
+    widths = np.array([edges[column][1] - edges[column][0] for column in columns])
+    offsets = np.arange(len(columns)) * bins
+
+    counts = {column: {} for column in columns}
+    for key_element in dfs:
+        values = dfs[key_element][columns].to_numpy(dtype=float) / scale
+        valid = ~np.isnan(values)
+        # bin index per value, the upper edge belongs to the last bin as in np.histogram
+        indices = np.clip(np.floor((values - lowers) / widths), 0, bins - 1)
+        indices = (np.where(valid, indices, 0).astype(np.int64) + offsets)[valid]
+        flat_counts = np.bincount(indices, minlength=len(columns) * bins).reshape(len(columns), bins)
+        for j, column in enumerate(columns):
+            counts[column][key_element] = flat_counts[j]
+
+    return {column: {'edges': edges[column], 'counts': counts[column]} for column in columns}
+
+
+def get_cache_file(name, files, columns, bins, scale, settings):
+    """ return cache file for given histograms, key are the input files with modification time and all settings """
+    key = json.dumps([name, {key_element: [str(path), Path(path).stat().st_mtime] for key_element, path in
+                             files.items()}, list(columns), bins, scale, settings], sort_keys=True)
+    return Path(cache_folder) / (hashlib.sha1(key.encode()).hexdigest() + '.npz')
+
+
+def save_histograms(cache_file, histograms):
+    """ save edges and counts of all scenarios per column in one npz file """
+    keys = list(next(iter(histograms.values()))['counts'])
+    arrays = {'keys': np.array(keys)}
+    for column in histograms:
+        arrays[column + '_edges'] = histograms[column]['edges']
+        arrays[column + '_counts'] = np.array([histograms[column]['counts'][key_element] for key_element in keys])
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(cache_file, **arrays)
+
+
+def load_histograms(cache_file, columns):
+    """ load histograms saved by save_histograms """
+    with np.load(cache_file) as arrays:
+        keys = list(arrays['keys'])
+        return {column: {'edges': arrays[column + '_edges'],
+                         'counts': dict(zip(keys, arrays[column + '_counts']))} for column in columns}
+
+
+def get_histograms(name, files, get_dfs, columns, bins, scale=1, compute=compute_histograms, settings=None):
+    """ return histograms from cache file, the scenarios are only fetched by get_dfs and binned if not cached yet """
+    cache_file = get_cache_file(name, files, columns, bins, scale, settings)
+    if cache_file.exists():
+        return load_histograms(cache_file, columns)
+    histograms = compute(get_dfs(), columns, bins, scale)
+    save_histograms(cache_file, histograms)
+    return histograms
+
+
+def draw_histogram(ax, edges, counts, errors=None):
+    """ draw precomputed counts as bars on given axis, with error bars if errors are given """
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', yerr=errors)
@@ -0,0 +1,194 @@
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+import pandas as pd
+
+checkpoints = ['b1', 'b2', 'b3', 'b4', 'b5']
+batch_size = 50000  # rows converted and written at once, bounds memory use independent of workbook size
+excel_epoch = datetime(1899, 12, 30)
+time_zone = 'Europe/Berlin'  # zone the exports are recorded in, used by the pandas and the lazy backend
+# type of a column whose values do not fit the type inferred from the first batch
+wider_types = {'int64': 'float64', 'float64': 'string'}
+# written after all sheets are converted, a cache without it is incomplete
+marker_name = '_complete'
+
+
+def get_cache_path(xlsx_path):
+    """ return folder of the columnar cache for given workbook, one parquet file per sheet """
+    return Path(xlsx_path).with_suffix('.parquet')
+
+
+def to_datetime(value):
+    """ return checkpoint cell as datetime, numbers are Excel serial dates of cells without date format """
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        return datetime.strptime(value, '%d/%m/%Y %H:%M:%S') if value else None
+    return excel_epoch + timedelta(days=value)
+
+
+def to_unix_time(value):
+    """ return unix timestamp in whole seconds of a naive checkpoint datetime in the exports zone, NaN if missing """
+    if pd.isna(value):
+        return float('nan')
+    # ambiguous times at the end of daylight saving time resolve to the earlier one
+    return value.replace(microsecond=0, tzinfo=ZoneInfo(time_zone)).timestamp()
+
+
+def from_unix_time(timestamp):
+    """ return datetime of given unix timestamp in the zone of the exports """
+    return datetime.fromtimestamp(timestamp, ZoneInfo(time_zone))
+
+
+def get_column_names(header):
+    """ return column names from header row, empty headers are named like pandas does """
+    return [str(name) if name is not None else 'Unnamed: ' + str(i) for i, name in enumerate(header)]
+
+
+def infer_type(values):
+    """ return arrow type of given cell values of a column other than the checkpoints, int64, float64 or string """
+    values = [v for v in values if v is not None]
+    if values and all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return 'int64'
+    if values and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return 'float64'
+    return 'string'
+
+
+def get_schema(column_names, column_types):
+    """ return fixed arrow schema of a sheet, checkpoints as timestamp and every other column by given type """
+    import pyarrow as pa
+    return pa.schema([(name, pa.timestamp('us') if name in checkpoints else pa.type_for_alias(column_types[name]))
+                      for name in column_names])
+
+
+def to_array(values, field):
+    """ return arrow array of cell values with type of given field, None if the values do not fit without loss """
+    import pyarrow as pa
+    if field.name in checkpoints:
+        return pa.array([to_datetime(v) for v in values], type=field.type)
+    if pa.types.is_string(field.type):
+        return pa.array([str(v) if v is not None else None for v in values], type=field.type)
+    try:
+        array = pa.array(values)
+        if not (pa.types.is_null(array.type) or pa.types.is_integer(array.type) or
+                pa.types.is_floating(array.type)):
+            return None
+        # safe cast fails instead of truncating e.g. 1.5 to an int64 column
+        return array.cast(field.type, safe=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+
+
+def get_batches(worksheet, width):
+    """ yield rows of given worksheet after the header in lists of batch_size, padded to given width """
+    rows = []
+    for row in worksheet.iter_rows(min_row=2, values_only=True):
+        # skip formatted but empty rows at the end of the sheet
+        if all(v is None for v in row):
+            continue
+        rows.append((row + (None,) * (width - len(row)))[:width])
+        if len(rows) == batch_size:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+def write_sheet(worksheet, temp_path, column_names, column_types):
+    """ write all batches with given column types, returns number of rows and columns with values not fitting """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = get_schema(column_names, column_types)
+    writer = pq.ParquetWriter(temp_path, schema)
+    count = 0
+    try:
+        for rows in get_batches(worksheet, len(column_names)):
+            columns = list(zip(*rows))
+            arrays = [to_array(columns[i], field) for i, field in enumerate(schema)]
+            misfits = [field.name for field, array in zip(schema, arrays) if array is None]
+            if misfits:
+                return count, misfits
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    finally:
+        writer.close()
+    return count, []
+
+
+def convert_sheet(worksheet, parquet_path):
+    """ stream rows of given worksheet in batches into a parquet file, returns number of written rows """
+    header = next(worksheet.iter_rows(max_row=1, values_only=True), None)
+    if header is None:
+        return 0
+    column_names = get_column_names(header)
+    first_batch = next(get_batches(worksheet, len(column_names)), [])
+    column_types = {name: infer_type([row[i] for row in first_batch])
+                    for i, name in enumerate(column_names) if name not in checkpoints}
+    # written under a temporary name, an interrupted conversion never leaves a readable but truncated sheet
+    temp_path = parquet_path.with_suffix('.tmp')
+    count, misfits = write_sheet(worksheet, temp_path, column_names, column_types)
+    while misfits:
+        # later values do not fit the type inferred from the first batch, the sheet is converted again
+        for name in misfits:
+            column_types[name] = wider_types[column_types[name]]
+        count, misfits = write_sheet(worksheet, temp_path, column_names, column_types)
+    temp_path.replace(parquet_path)
+    return count
+
+
+def convert_excel(xlsx_path):
+    """ convert every sheet of given AnyLogic export into the columnar cache, returns cache folder """
+    import openpyxl
+    cache_path = get_cache_path(xlsx_path)
+    cache_path.mkdir(parents=True, exist_ok=True)
+    # remove sheets, leftovers and marker of an outdated or interrupted conversion
+    for cached_file in cache_path.iterdir():
+        cached_file.unlink()
+    start = time.time()
+    # read only mode streams the sheet xml instead of loading the whole workbook
+    workbook = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            count = convert_sheet(worksheet, cache_path / (worksheet.title + '.parquet'))
+            print('converted ' + str(count) + ' rows of sheet ' + worksheet.title + ' from ' + str(xlsx_path))
+    finally:
+        workbook.close()
+    (cache_path / marker_name).touch()
+    print('conversion took ' + str(round(time.time() - start, 1)) + 's')
+    return cache_path
+
+
+def read_cache(parquet_files):
+    """ read given sheets of a columnar cache into one dataframe with the sheet name as extra column """
+    frames = []
+    for parquet_path in parquet_files:
+        frame = pd.read_parquet(parquet_path)
+        # every column is kept in the cache, drop unnamed ones without any value like pandas gets from the sheet
+        frame = frame.drop(columns=[c for c in frame if c.startswith('Unnamed: ') and frame[c].isna().all()])
+        frame['sheet'] = parquet_path.stem
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_cached_files(xlsx_path):
+    """ return parquet files of the cache for given workbook, (re)builds the cache if incomplete or outdated """
+    cache_path = get_cache_path(xlsx_path)
+    marker = cache_path / marker_name
+    if not marker.exists() or marker.stat().st_mtime < Path(xlsx_path).stat().st_mtime:
+        convert_excel(xlsx_path)
+    return sorted(cache_path.glob('*.parquet'))
+
+
+def get_passenger_files(xlsx_path):
+    """ return cached sheets of given workbook with all checkpoint columns, other sheets like parameters are skipped """
+    import pyarrow.parquet as pq
+    return [f for f in get_cached_files(xlsx_path) if set(checkpoints) <= set(pq.read_schema(f).names)]
+
+
+def read_data(path):
+    """ read passengers from ;-separated csv or AnyLogic Excel export, the export is converted to cache once """
+    if Path(path).suffix != '.xlsx':
+        return pd.read_csv(path, sep=';')
+    return read_cache(get_passenger_files(path))
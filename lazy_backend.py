@@ -0,0 +1,198 @@
+from pathlib import Path
+import numpy as np
+import metrics_store
+from ingestion import get_passenger_files, time_zone
+from validation import checkpoints, valid_types, max_stay
+
+try:
+    import polars as pl
+except ImportError:
+    # lazy backend is optional, without polars every script runs on pandas
+    pl = None
+
+week_length = 60 * 60 * 24 * 7
+diff_columns = ['b1_b2_diff', 'b2_b3_diff', 'b3_b4_diff', 'b4_b5_diff', 'b1_b5_diff']
+
+
+def is_lazy_frame(df):
+    """ return whether given frame is a lazy frame of this backend """
+    return pl is not None and isinstance(df, pl.LazyFrame)
+
+
+def is_lazy(dfs):
+    """ return whether given scenarios are lazy frames of this backend """
+    return is_lazy_frame(next(iter(dfs.values())))
+
+
+def scan_data(path):
+    """ return lazy frame over ;-separated csv or the columnar cache of an Excel export, nothing is read yet """
+    if pl is None:
+        raise ImportError('lazy backend requires polars')
+    if Path(path).suffix == '.xlsx':
+        # sheets may differ in their extra columns, missing ones are filled with nulls like pandas.concat does
+        return pl.concat([pl.scan_parquet(f).with_columns(pl.lit(f.stem).alias('sheet'))
+                          for f in get_passenger_files(path)], how='diagonal_relaxed')
+    return pl.scan_csv(path, separator=';', infer_schema_length=0)
+
+
+def to_timestamp(column, dtype):
+    """ return expression with unix timestamp of given checkpoint column, csv columns are still strings """
+    expression = pl.col(column)
+    if dtype == pl.String:
+        expression = expression.replace('', None).str.strptime(pl.Datetime, '%d/%m/%Y %H:%M:%S')
+    # ambiguous times resolve to the earlier one like ingestion.to_unix_time
+    local = expression.dt.replace_time_zone(time_zone, ambiguous='earliest', non_existent='null')
+    # times skipped at the start of daylight saving time get the offset before the gap, like zoneinfo with fold=0
+    shifted = (expression - pl.duration(hours=1)).dt.replace_time_zone(time_zone, ambiguous='earliest',
+                                                                       non_existent='null') + pl.duration(hours=1)
+    return pl.coalesce(local, shifted).dt.epoch('s')
+
+
+def get_rejections(schema):
+    """ return expression per rule, True for every passenger violating the rule, like validation.get_rejections """
+    distinct = checkpoints + (['type'] if 'type' in schema else [])
+    rejections = {
+        'missing': pl.any_horizontal([pl.col(c + '_timestamp').is_null() for c in checkpoints]),
+        'order': pl.any_horizontal([pl.col(start + '_timestamp') > pl.col(end + '_timestamp')
+                                    for start, end in zip(checkpoints, checkpoints[1:])]),
+        'max_stay': pl.col('b5_timestamp') - pl.col('b1_timestamp') > max_stay,
+        'duplicate': ~pl.struct(distinct).is_first_distinct(),
+    }
+    if 'type' in schema:
+        rejections['type'] = ~pl.col('type').is_in(valid_types)
+    # missing timestamps only violate the missing rule, as NaN comparisons in the pandas path
+    return {rule: rejections[rule].fill_null(False) for rule in rejections}
+
+
+def prepare_data(lazy, business_only=False):
+    """ add timestamps, waiting times and rejection flags per rule like cleanup_data and add_timestamps, lazily """
+    schema = lazy.collect_schema()
+    lazy = lazy.with_columns([to_timestamp(c, schema[c]).alias(c + '_timestamp') for c in checkpoints])
+    lazy = lazy.filter(pl.col('b5_timestamp').is_not_null())
+    if business_only:
+        lazy = lazy.filter(pl.col('type') == 'business')
+    rejections = get_rejections(schema)
+
+    return lazy.select(
+        [pl.col(c + '_timestamp') for c in checkpoints] +
+        [(pl.col(end + '_timestamp') - pl.col(start + '_timestamp')).alias(start + '_' + end + '_diff')
+         for start, end in zip(checkpoints, checkpoints[1:])] +
+        [(pl.col('b5_timestamp') - pl.col('b1_timestamp')).alias('b1_b5_diff')] +
+        [rejections[rule].alias('rejected_' + rule) for rule in rejections])
+
+
+def materialize(dfs):
+    """ run prepared plans of all scenarios once and keep the typed frames in memory for the reports """
+    return {key: result.lazy() for key, result in collect_all(dfs).items()}
+
+
+def validate_data(lazy, name):
+    """ drop implausible passengers and log count per rule like validation.validate_data, without quarantine file """
+    rules = [c[len('rejected_'):] for c in lazy.collect_schema() if c.startswith('rejected_')]
+    counts = lazy.select([pl.col('rejected_' + rule).sum() for rule in rules]).collect()
+    for rule in rules:
+        count = int(counts['rejected_' + rule][0])
+        metrics_store.add_statistic('validation', name, 'b1_b5', rule, count)
+        if count:
+            print('rejected ' + str(count) + ' passengers of ' + name + ' by rule ' + rule)
+    # filtered once in memory, so the reports do not read the rejection flags again
+    return lazy.filter(~pl.any_horizontal([pl.col('rejected_' + rule) for rule in rules])).drop(
+        ['rejected_' + rule for rule in rules]).collect().lazy()
+
+
+def collect_all(queries):
+    """ run queries of all scenarios at once on the multi-threaded engine, returns results by scenario """
+    keys = list(queries)
+    return dict(zip(keys, pl.collect_all([queries[key] for key in keys])))
+
+
+def get_average_waiting_times(dfs, time_step_size):
+    """ return mean b1 to b5 waiting time in minutes per time bin of b5, empty bins repeat the previous value """
+    steps = len(range(0, week_length, time_step_size))
+    queries = {key: dfs[key].group_by(((pl.col('b5_timestamp') % week_length) // time_step_size).alias('bin'))
+               .agg((pl.col('b1_b5_diff').mean() / 60).alias('mean')) for key in dfs}
+    means_by_time = {}
+    for key, result in collect_all(queries).items():
+        means = np.full(steps, np.nan)
+        means[result['bin'].to_numpy()] = result['mean'].to_numpy()
+        means_by_time[key] = []
+        for value in means:
+            if np.isnan(value):
+                value = means_by_time[key][-1] if means_by_time[key] else 0
+            means_by_time[key].append(value)
+    return means_by_time
+
+
+def get_sla_by_time(dfs, time_step_size, sla_time):
+    """ return share of passengers within SLA per time bin (i, i + time_step_size] of b5, empty bins are 0 """
+    steps = len(range(0, week_length, time_step_size))
+    week_time = pl.col('b5_timestamp') % week_length
+    queries = {key: dfs[key].filter(week_time > 0)
+               .group_by(((week_time + time_step_size - 1) // time_step_size - 1).alias('bin'))
+               .agg((pl.col('b1_b5_diff') <= sla_time).mean().alias('share')) for key in dfs}
+    numbers_by_time = {}
+    for key, result in collect_all(queries).items():
+        shares = np.zeros(steps)
+        shares[result['bin'].to_numpy()] = result['share'].to_numpy()
+        numbers_by_time[key] = list(shares)
+    return numbers_by_time
+
+
+def get_passengers_in_system(dfs, time_step_size, number_of_weeks):
+    """ return passengers with b1 <= t < b5 in week time per time step t, like plot_passengers_in_system """
+    steps = len(range(0, week_length, time_step_size))
+    enter = pl.col('b1_timestamp') % week_length
+    leave = pl.col('b5_timestamp') % week_length
+    # +1 at the first time step within the stay, -1 at the first one after it
+    queries = {key: dfs[key].filter(enter < leave).select(
+        ((enter + time_step_size - 1) // time_step_size).alias('first_in'),
+        ((leave + time_step_size - 1) // time_step_size).alias('first_out')) for key in dfs}
+    numbers_by_time = {}
+    for key, result in collect_all(queries).items():
+        changes = (np.bincount(result['first_in'].to_numpy(), minlength=steps + 1) -
+                   np.bincount(result['first_out'].to_numpy(), minlength=steps + 1))
+        numbers_by_time[key] = list(np.cumsum(changes)[:steps] // number_of_weeks)
+    return numbers_by_time
+
+
+def compute_histograms(dfs, columns, bins, scale=1):
+    """ return counts per scenario and column with shared edges, same result as histograms.compute_histograms """
+    ranges = collect_all({key: dfs[key].select(
+        [(pl.col(c).min() / scale).alias(c + '_min') for c in columns] +
+        [(pl.col(c).max() / scale).alias(c + '_max') for c in columns]) for key in dfs})
+    edges = {}
+    for column in columns:
+        lower = min(ranges[key][column + '_min'][0] for key in dfs)
+        upper = max(ranges[key][column + '_max'][0] for key in dfs)
+        if lower == upper:
+            lower, upper = lower - 0.5, upper + 0.5
+        edges[column] = np.linspace(lower, upper, bins + 1)
+
+    # bin index per value, the upper edge belongs to the last bin as in np.histogram
+    results = collect_all({key: dfs[key].select(
+        [((pl.col(c) / scale - edges[c][0]) / (edges[c][1] - edges[c][0])).floor().clip(0, bins - 1).cast(pl.Int64)
+         .alias(c) for c in columns]) for key in dfs})
+    return {column: {'edges': edges[column],
+                     'counts': {key: np.bincount(results[key][column].drop_nulls().to_numpy(), minlength=bins)
+                                for key in dfs}}
+            for column in columns}
+
+
+def get_stage_frames(dfs):
+    """ return pandas frames with only the checkpoint timestamps needed for the stage metrics """
+    results = collect_all({key: dfs[key].select([c + '_timestamp' for c in checkpoints]) for key in dfs})
+    return {key: results[key].to_pandas() for key in results}
+
+
+def get_waiting_time_statistics(lazy, scale=60):
+    """ return min, max, mean and standard deviation per waiting time column in one aggregation """
+    result = lazy.select([getattr(pl.col(c) / scale, name)().alias(c + '_' + name)
+                          for c in diff_columns for name in ['min', 'max', 'mean', 'std']]).collect()
+    return {c: {'min': result[c + '_min'][0], 'max': result[c + '_max'][0], 'mean': result[c + '_mean'][0],
+                'stdev': result[c + '_std'][0]} for c in diff_columns}
+
+
+def get_sla(lazy, sla_time):
+    """ return share of passengers within SLA and number of passengers """
+    result = lazy.select((pl.col('b1_b5_diff') <= sla_time).mean().alias('share'), pl.len().alias('count')).collect()
+    return result['share'][0], result['count'][0]
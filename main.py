@@ -1,14 +1,14 @@
-import time
 from datetime import datetime
-import statistics
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 from fitter import Fitter
 from pathlib import Path
+import metrics_store
+from ingestion import read_data, to_unix_time, from_unix_time
+from validation import validate_data, quarantine_folder
 
 
-def plot_and_save(data_to_plot, title, x_label, y_label, filename, bins, fit_dist):
+def plot_and_save(data_to_plot, title, x_label, y_label, filename, bins, fit_dist, scenario, segment='b1_b5'):
     plt.rcParams.update({'figure.figsize': (7, 5), 'figure.dpi': 100})
     plt.hist(data_to_plot, bins=bins)
     folder = 'Distribution_plots/' if fit_dist else 'Images/'
@@ -30,12 +30,8 @@ def plot_and_save(data_to_plot, title, x_label, y_label, filename, bins, fit_dis
         fitter = Fitter(data_to_plot, distributions=dist_in_both, timeout=600)
         fitter.fit()
         fitter.summary(Nbest=3)
-        # save information about distribution fitting in txt file
-        f = open("fitting_distribution_data.txt", "a")
-        f.write('*' * 80 + '\n')
-        f.write('fitter info for ' + filename + ':\n')
-        f.write(str(fitter.get_best()) + '\n\n')
-        f.close()
+        # save information about distribution fitting in metrics store
+        metrics_store.add_fit_result('fit', scenario, segment, fitter.get_best())
 
     plt.gca().set(title=title, ylabel=y_label, xlabel=x_label)
     plt.savefig(folder + filename)
@@ -68,7 +64,7 @@ def add_data_fields(raw_data):
     # raw_data['is_weekday'] = raw_data.apply(lambda row: is_weekday(row), axis=1)
 
     # add column with weekday number
-    raw_data['weekday'] = raw_data.apply(lambda row: datetime.fromtimestamp(row['b1_timestamp']).weekday(), axis=1)
+    raw_data['weekday'] = raw_data.apply(lambda row: from_unix_time(row['b1_timestamp']).weekday(), axis=1)
 
     # hour of arrival
     raw_data['arrival_time'] = raw_data.apply(lambda row: get_daytime(row), axis=1)
@@ -86,38 +82,37 @@ def add_data_fields(raw_data):
 
 def to_timestamp(row, column_name):
     """ returns timestamp from given row and given column name """
-    return time.mktime(datetime.strptime(row[column_name], '%d/%m/%Y %H:%M:%S').timetuple())
+    value = row[column_name]
+    # csv files contain strings, the cache of Excel exports already typed datetimes
+    if isinstance(value, str):
+        value = datetime.strptime(value, '%d/%m/%Y %H:%M:%S')
+    return to_unix_time(value)
 
 
 def get_daytime(s):
     """ return hour of day from given row and given column name """
-    return datetime.fromtimestamp(s['b1_timestamp']).hour
+    return from_unix_time(s['b1_timestamp']).hour
 
 
 def get_basic_analysis(data, type_name):
     """ do some basic data analysis from given dataset like max waiting time, min waiting time and mean waiting time"""
-    f = open("data_analysis_dump.txt", "a")
-    f.write('*' * 80 + '\n')
-    f.write('Basic analysis for ' + type_name + ':\n')
-    f.write('max: ' + str(max(data['b1_b5_diff']) / 60) + '\n')
-    f.write('min: ' + str(min(data['b1_b5_diff']) / 60) + '\n')
-    f.write('mean: ' + str(statistics.mean(data['b1_b5_diff']) / 60) + '\n')
-    f.write('standard deviation: ' + str(statistics.stdev(data['b1_b5_diff']) / 60) + '\n\n')
-    f.close()
+    metrics_store.add_statistics('basic', type_name, 'b1_b5', data['b1_b5_diff'], scale=60)
 
 
 def plot_waiting_time_complete(df, type_name, get_dist):
     """ plot distribution of complete waiting time for given dataframe """
     df_diff = [x / 60 for x in df['b1_b5_diff']]
     plot_and_save(df_diff, title='Verteilung Wartezeit ' + type_name, y_label='Occurrences', x_label='Wartezeit[min]',
-                  filename='Verteilung Wartezeit ' + type_name + '.png', bins=250, fit_dist=get_dist)
+                  filename='Verteilung Wartezeit ' + type_name + '.png', bins=250, fit_dist=get_dist,
+                  scenario=type_name)
 
 
 def plot_arrivals(df, type_name, get_dist):
     """ plot arrival rate of given dataframe by daytime"""
     df_arrivals = [x for x in df['arrival_time']]
     plot_and_save(df_arrivals, title='Ankunft ' + type_name, y_label='Occurrences', x_label='Uhrzeit[h]',
-                  filename='Ankunft ' + type_name + '.png', bins=24, fit_dist=get_dist)
+                  filename='Ankunft ' + type_name + '.png', bins=24, fit_dist=get_dist, scenario=type_name,
+                  segment='arrival')
 
 
 def plot_waiting_times(df, type_name, get_dist):
@@ -128,35 +123,22 @@ def plot_waiting_times(df, type_name, get_dist):
         plot_and_save(df_diff, title='Wartezeit zwischen ' + 'b' + str(i) + ' und b' + str(i + 1) + ' für ' + type_name,
                       y_label='Wartezeit', x_label='Wartezeit[min]',
                       filename='Wartezeit zwischen ' + 'b' + str(i) + ' und b' + str(
-                          i + 1) + ' für ' + type_name + '.png', bins=100, fit_dist=get_dist)
+                          i + 1) + ' für ' + type_name + '.png', bins=100, fit_dist=get_dist,
+                      scenario=type_name, segment='b' + str(i) + '_b' + str(i + 1))
     df_diff = df['b1_b5_diff']
     df_diff = [x / 60 for x in df_diff]
     plot_and_save(df_diff, title='Wartezeit zwischen b1 und b5' + ' für ' + type_name,
                   y_label='Wartezeit', x_label='Wartezeit[min]',
-                  filename='Wartezeit zwischen b1 und b5 für ' + type_name + '.png', bins=100, fit_dist=get_dist)
+                  filename='Wartezeit zwischen b1 und b5 für ' + type_name + '.png', bins=100, fit_dist=get_dist,
+                  scenario=type_name)
 
 
 def analyze_waiting_times(df, type_name):
     """ get data analysis for waiting time between checkpoints"""
-    f = open("data_analysis_dump.txt", "a")
-    f.write('*' * 80 + '\n')
-    f.write('Wartezeiten fuer ' + type_name + ':\n')
     for i in range(1, 5):
-        df_diff = df['b' + str(i) + '_b' + str(i + 1) + '_diff']
-        df_diff = [x / 60 for x in df_diff]
-        f.write('zwischen ' + 'b' + str(i) + ' und b' + str(i + 1) + '\n')
-        f.write('min: ' + str(min(df_diff)) + '\n')
-        f.write('max: ' + str(max(df_diff)) + '\n')
-        f.write('Durchschnitt: ' + str(statistics.mean(df_diff)) + '\n')
-        f.write('Standardabweichung: ' + str(statistics.stdev(df_diff)) + '\n\n')
-    df_diff = df['b1''_b5''_diff']
-    df_diff = [x / 60 for x in df_diff]
-    f.write('zwischen ' + 'b1 und b5''\n')
-    f.write('min: ' + str(min(df_diff)) + '\n')
-    f.write('max: ' + str(max(df_diff)) + '\n')
-    f.write('Durchschnitt: ' + str(statistics.mean(df_diff)) + '\n')
-    f.write('Standardabweichung: ' + str(statistics.stdev(df_diff)) + '\n\n')
-    f.close()
+        metrics_store.add_statistics('waiting_times', type_name, 'b' + str(i) + '_b' + str(i + 1),
+                                     df['b' + str(i) + '_b' + str(i + 1) + '_diff'], scale=60)
+    metrics_store.add_statistics('waiting_times', type_name, 'b1_b5', df['b1_b5_diff'], scale=60)
 
 
 def do_stuff(df, time_name, get_dist):
@@ -184,14 +166,18 @@ if __name__ == '__main__':
     # clear output txt files
     open("data_analysis_dump.txt", "w").close()
     open("fitting_distribution_data.txt", "w").close()
+    conn = metrics_store.connect()
+    run_id = metrics_store.start_run(conn, 'main')
 
     Path("Images/").mkdir(parents=True, exist_ok=True)
     Path("Distribution_plots/").mkdir(parents=True, exist_ok=True)
+    Path(quarantine_folder).mkdir(parents=True, exist_ok=True)
 
-    data_frame = pd.read_csv('sim_data.csv', sep=';')
+    data_frame = read_data('sim_data.csv')
 
     data_frame = cleanup_data(data_frame)
     data_frame = add_timestamps(data_frame)
+    data_frame = validate_data(data_frame, 'sim_data')
     data_frame = add_data_fields(data_frame)
 
     # all weekdays
@@ -207,3 +193,9 @@ if __name__ == '__main__':
     analyze_waiting_times(data_frame, 'alle')
 
     # do_stuff_single_day(data_frame)
+
+    metrics_store.flush(conn, run_id)
+    metrics_store.render_basic_analysis(conn, run_id, "data_analysis_dump.txt")
+    metrics_store.render_waiting_times(conn, run_id, "data_analysis_dump.txt")
+    metrics_store.render_fit_results(conn, run_id, 'fit', "fitting_distribution_data.txt")
+    conn.close()
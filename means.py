@@ -2,6 +2,9 @@ import time
 from datetime import datetime
 import numpy as np
 import pandas as pd
+from pathlib import Path
+import metrics_store
+from validation import validate_data, get_record_rejections, quarantine_folder
 
 day_length = 60 * 60 * 24
 resolution = 60 * 60  # resolution of arrival rates in seconds
@@ -59,11 +62,8 @@ def analysis(df, time_name):
         hours = 24 - hours
 
     for i in types:
-        f = open("arrival_rates_data_const.txt", "a")
-        f.write('*' * 80 + '\n')
-        f.write('Ankunftsraten fuer ' + i + ' ' + time_name + ':\n')
-        f.write('absolute Anzahl: ' + str(len(df[df['type'] == i].arrival_time) / hours) + '\n\n')
-        f.close()
+        metrics_store.add_rate('const', i + ' ' + time_name, 'arrival', 'absolute',
+                               len(df[df['type'] == i].arrival_time) / hours)
 
 
 def analysis_single_day(df):
@@ -82,12 +82,22 @@ def analysis_single_day(df):
 if __name__ == '__main__':
     # clear output txt files
     open("arrival_rates_data_const.txt", "w").close()
+    conn = metrics_store.connect()
+    run_id = metrics_store.start_run(conn, 'means')
+    Path(quarantine_folder).mkdir(parents=True, exist_ok=True)
 
     data_frame = pd.read_csv('data.csv', sep=';')
 
     data_frame = cleanup_data(data_frame)
+    # duplicate passengers and unknown types would distort the arrival counts
+    data_frame = validate_data(data_frame, 'data', rules=get_record_rejections)
     data_frame = add_weekly_normed_timestamps(data_frame)
     if get_single_days:
         analysis_single_day(data_frame)
+
+    metrics_store.flush(conn, run_id)
+    metrics_store.render_rate_table(conn, run_id, 'const', "arrival_rates_data_const.txt",
+                                    lambda bucket: 'absolute Anzahl: ')
+    conn.close()
 #    else:
 # analysis_working_day_weekend(data_frame)
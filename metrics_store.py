@@ -0,0 +1,245 @@
+import json
+import sqlite3
+import statistics
+from datetime import datetime
+
+database_file = 'metrics.sqlite'
+
+# value and rate columns have no declared type, so ints and floats are kept as passed in
+schema = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    script TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    preview INTEGER NOT NULL DEFAULT 0,
+    preview_fraction REAL
+);
+CREATE TABLE IF NOT EXISTS scenarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS statistics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    report TEXT NOT NULL,
+    scenario_id INTEGER NOT NULL REFERENCES scenarios(id),
+    segment_id INTEGER NOT NULL REFERENCES segments(id),
+    name TEXT NOT NULL,
+    value
+);
+CREATE TABLE IF NOT EXISTS fit_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    report TEXT NOT NULL,
+    scenario_id INTEGER NOT NULL REFERENCES scenarios(id),
+    segment_id INTEGER NOT NULL REFERENCES segments(id),
+    distribution TEXT NOT NULL,
+    params TEXT NOT NULL,
+    ks REAL,
+    ad REAL,
+    aic REAL,
+    bic REAL
+);
+CREATE TABLE IF NOT EXISTS rate_tables (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    report TEXT NOT NULL,
+    scenario_id INTEGER NOT NULL REFERENCES scenarios(id),
+    segment_id INTEGER NOT NULL REFERENCES segments(id),
+    bucket TEXT NOT NULL,
+    rate
+);
+CREATE INDEX IF NOT EXISTS statistics_scenario_segment ON statistics (scenario_id, segment_id, name);
+CREATE INDEX IF NOT EXISTS fit_results_scenario_segment ON fit_results (scenario_id, segment_id);
+CREATE INDEX IF NOT EXISTS rate_tables_scenario_segment ON rate_tables (scenario_id, segment_id);
+'''
+
+# pending rows per table, written in one transaction by flush()
+pending = {'statistics': [], 'fit_results': [], 'rate_tables': []}
+
+
+def connect(path=database_file):
+    """ open metrics database and create tables if missing """
+    conn = sqlite3.connect(path)
+    conn.executescript(schema)
+    return conn
+
+
+def start_run(conn, script, preview=False, preview_fraction=None):
+    """ register a new run and return its id, preview runs are computed on a sample with given fraction """
+    with conn:
+        cursor = conn.execute('INSERT INTO runs (script, started_at, preview, preview_fraction) VALUES (?, ?, ?, ?)',
+                              (script, datetime.now().isoformat(timespec='seconds'), int(preview),
+                               preview_fraction if preview else None))
+    return cursor.lastrowid
+
+
+def get_id(conn, table, name):
+    """ return id of scenario or segment with given name, insert it if unknown """
+    conn.execute('INSERT OR IGNORE INTO ' + table + ' (name) VALUES (?)', (name,))
+    return conn.execute('SELECT id FROM ' + table + ' WHERE name = ?', (name,)).fetchone()[0]
+
+
+def add_statistics(report, scenario, segment, values, scale=1):
+    """ queue min, max, mean and standard deviation of given values """
+    values = [x / scale for x in values]
+    for name, value in [('min', min(values)), ('max', max(values)), ('mean', statistics.mean(values)),
+                        ('stdev', statistics.stdev(values))]:
+        pending['statistics'].append((report, scenario, segment, name, value))
+
+
+def add_statistic(report, scenario, segment, name, value):
+    """ queue a single named value """
+    pending['statistics'].append((report, scenario, segment, name, value))
+
+
+def add_fit_result(report, scenario, segment, best_fit):
+    """ queue best fitted distribution as returned by Fitter.get_best() """
+    for distribution, params in best_fit.items():
+        pending['fit_results'].append((report, scenario, segment, distribution, json.dumps(params), None, None,
+                                       None, None))
+
+
+def add_fit_ranking(report, scenario, segment, ranking):
+    """ queue scored distributions as returned by fit_evaluation.evaluate_fits(), best first """
+    for result in ranking:
+        pending['fit_results'].append((report, scenario, segment, result['distribution'],
+                                       json.dumps(result['params']), result['ks'], result['ad'], result['aic'],
+                                       result['bic']))
+
+
+def add_rate(report, scenario, segment, bucket, rate):
+    """ queue a single entry of a rate table """
+    pending['rate_tables'].append((report, scenario, segment, str(bucket), rate))
+
+
+def flush(conn, run_id):
+    """ write all queued rows of given run in one transaction """
+    columns = {'statistics': ['name', 'value'], 'fit_results': ['distribution', 'params', 'ks', 'ad', 'aic', 'bic'],
+               'rate_tables': ['bucket', 'rate']}
+    ids = {}
+    with conn:
+        for table in pending:
+            rows = []
+            for report, scenario, segment, *rest in pending[table]:
+                if ('scenarios', scenario) not in ids:
+                    ids[('scenarios', scenario)] = get_id(conn, 'scenarios', scenario)
+                if ('segments', segment) not in ids:
+                    ids[('segments', segment)] = get_id(conn, 'segments', segment)
+                rows.append((run_id, report, ids[('scenarios', scenario)], ids[('segments', segment)]) + tuple(rest))
+            conn.executemany('INSERT INTO ' + table + ' (run_id, report, scenario_id, segment_id, ' +
+                             ', '.join(columns[table]) + ') VALUES (' + ', '.join('?' * (4 + len(columns[table]))) +
+                             ')', rows)
+            pending[table].clear()
+
+
+def get_statistics(conn, run_id, report):
+    """ return statistics of given run and report grouped by scenario and segment in insertion order """
+    rows = conn.execute('SELECT sc.name, se.name, st.name, st.value FROM statistics st '
+                        'JOIN scenarios sc ON sc.id = st.scenario_id JOIN segments se ON se.id = st.segment_id '
+                        'WHERE st.run_id = ? AND st.report = ? ORDER BY st.id', (run_id, report))
+    grouped = {}
+    for scenario, segment, name, value in rows:
+        grouped.setdefault(scenario, {}).setdefault(segment, {})[name] = value
+    return grouped
+
+
+def compare_runs(conn, report, scenario, segment, name, include_preview=False):
+    """ return value of given statistic for every run, e.g. mean b1_b5 waiting time, preview runs only if requested """
+    return conn.execute('SELECT r.id, r.started_at, r.preview_fraction, st.value FROM statistics st '
+                        'JOIN runs r ON r.id = st.run_id JOIN scenarios sc ON sc.id = st.scenario_id '
+                        'JOIN segments se ON se.id = st.segment_id '
+                        'WHERE st.report = ? AND sc.name = ? AND se.name = ? AND st.name = ? AND (r.preview = 0 OR ?) '
+                        'ORDER BY r.id', (report, scenario, segment, name, int(include_preview))).fetchall()
+
+
+def render_basic_analysis(conn, run_id, filename):
+    """ write basic analysis report of given run in the format of data_analysis_dump.txt """
+    f = open(filename, "a")
+    for scenario, segments in get_statistics(conn, run_id, 'basic').items():
+        values = segments['b1_b5']
+        f.write('*' * 80 + '\n')
+        f.write('Basic analysis for ' + scenario + ':\n')
+        f.write('max: ' + str(values['max']) + '\n')
+        f.write('min: ' + str(values['min']) + '\n')
+        f.write('mean: ' + str(values['mean']) + '\n')
+        f.write('standard deviation: ' + str(values['stdev']) + '\n\n')
+    f.close()
+
+
+def render_waiting_times(conn, run_id, filename):
+    """ write waiting times report of given run in the format of waiting_times.txt """
+    f = open(filename, "a")
+    for scenario, segments in get_statistics(conn, run_id, 'waiting_times').items():
+        f.write('*' * 80 + '\n')
+        f.write('Wartezeiten fuer ' + scenario + ':\n')
+        for segment, values in segments.items():
+            f.write('zwischen ' + segment.replace('_', ' und ') + '\n')
+            f.write('min: ' + str(values['min']) + '\n')
+            f.write('max: ' + str(values['max']) + '\n')
+            f.write('Durchschnitt: ' + str(values['mean']) + '\n')
+            if 'mean_se' in values:
+                f.write('Standardfehler Durchschnitt: ' + str(values['mean_se']) + '\n')
+            f.write('Standardabweichung: ' + str(values['stdev']) + '\n\n')
+    f.close()
+
+
+def render_sla(conn, run_id, filename):
+    """ write SLA share per scenario of given run """
+    f = open(filename, "a")
+    f.write('\n\n')
+    f.write('*' * 80 + '\n')
+    for scenario, segments in get_statistics(conn, run_id, 'sla').items():
+        values = segments['b1_b5']
+        if 'sla_se' in values:
+            f.write('SLA ' + scenario + ':' + str(values['sla'])[0: 8] + ' +- ' + str(values['sla_se'])[0: 8] + '\n')
+        else:
+            f.write('SLA ' + scenario + ':' + str(values['sla'])[0: 8] + '\n')
+    f.close()
+
+
+def render_fit_results(conn, run_id, report, filename):
+    """ write best fitted distributions of given run in the format of the fitting txt files, with ranked scores """
+    rows = conn.execute('SELECT sc.name, se.name, f.distribution, f.params, f.ks, f.ad, f.aic, f.bic '
+                        'FROM fit_results f JOIN scenarios sc ON sc.id = f.scenario_id '
+                        'JOIN segments se ON se.id = f.segment_id '
+                        'WHERE f.run_id = ? AND f.report = ? ORDER BY f.id', (run_id, report))
+    grouped = {}
+    for scenario, segment, *result in rows:
+        grouped.setdefault((scenario, segment), []).append(result)
+    f = open(filename, "a")
+    for (scenario, segment), results in grouped.items():
+        distribution, params = results[0][0:2]
+        f.write('*' * 80 + '\n')
+        f.write('fitter info for ' + scenario + ' ' + segment + ':\n')
+        f.write(str({distribution: json.loads(params)}) + '\n')
+        if results[0][2] is not None:
+            f.write('{:<14}{:>12}{:>14}{:>16}{:>16}\n'.format('distribution', 'KS', 'AD', 'AIC', 'BIC'))
+            for distribution, params, *scores in results:
+                # sqlite stores NaN as NULL
+                scores = [float('nan') if score is None else score for score in scores]
+                f.write('{:<14}{:>12.5f}{:>14.3f}{:>16.1f}{:>16.1f}\n'.format(distribution, *scores))
+        f.write('\n')
+    f.close()
+
+
+def render_rate_table(conn, run_id, report, filename, bucket_label):
+    """ write arrival rate tables of given run, one block per scenario """
+    rows = conn.execute('SELECT sc.name, r.bucket, r.rate FROM rate_tables r '
+                        'JOIN scenarios sc ON sc.id = r.scenario_id '
+                        'WHERE r.run_id = ? AND r.report = ? ORDER BY r.id', (run_id, report))
+    grouped = {}
+    for scenario, bucket, rate in rows:
+        grouped.setdefault(scenario, []).append((bucket, rate))
+    f = open(filename, "a")
+    for scenario, rates in grouped.items():
+        f.write('*' * 80 + '\n')
+        f.write('Ankunftsraten fuer ' + scenario + ':\n')
+        for bucket, rate in rates:
+            f.write(bucket_label(bucket) + str(rate) + '\n')
+        f.write('\n')
+    f.close()
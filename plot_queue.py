@@ -0,0 +1,48 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# a 7x9 inch figure at dpi 1000 takes about 250 MB while rasterizing, so only a few plots are rendered at once
+max_default_workers = 3
+
+
+def start_renderer(workers=None, max_pending=None):
+    """ start pool of background processes rendering plots, pyplot is not thread safe so processes are used """
+    workers = workers or min(max_default_workers, max(1, (os.cpu_count() or 2) - 1))
+    # workers are not forked from the main process, which may already run the thread pool of the lazy backend
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return {'executor': ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method)),
+            'pending': set(), 'max_pending': max_pending or 2 * workers}
+
+
+def collect_done(renderer, futures):
+    """ remove finished plots from pending ones, raises the exception of a failed plot """
+    for future in futures:
+        renderer['pending'].discard(future)
+        future.result()
+
+
+def render(renderer, function, *args, **kwargs):
+    """ queue plot function with its arguments, blocks while too many plots are pending """
+    if renderer is None:
+        # no renderer given, plot synchronously
+        function(*args, **kwargs)
+        return
+    if len(renderer['pending']) >= renderer['max_pending']:
+        done, _ = wait(renderer['pending'], return_when=FIRST_COMPLETED)
+        collect_done(renderer, done)
+    renderer['pending'].add(renderer['executor'].submit(function, *args, **kwargs))
+
+
+def finish_rendering(renderer):
+    """ wait for all queued plots and shut down renderer, raises the exception of a failed plot """
+    try:
+        done, _ = wait(renderer['pending'])
+        collect_done(renderer, done)
+    finally:
+        cancel_rendering(renderer)
+
+
+def cancel_rendering(renderer):
+    """ drop plots not started yet and shut down renderer, waits only for the plots being rendered """
+    renderer['executor'].shutdown(cancel_futures=True)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+
+def draw_preview_sample(raw_data, fraction, seed):
+    """ return reproducible sample with the same share of passengers from every weekday and type """
+    rng = np.random.default_rng(seed)
+    # weekday parsed column-wise from b1, the full timestamps are only built for the sample
+    weekday = pd.to_datetime(raw_data['b1'], format='%d/%m/%Y %H:%M:%S').dt.weekday
+    strata = [weekday, raw_data['type']] if 'type' in raw_data else [weekday]
+    groups = raw_data.groupby(strata, dropna=False).ngroup().to_numpy()
+    # sample size per stratum rounded at random, so every passenger is drawn with exactly the given fraction and
+    # counts scaled by 1 / fraction stay unbiased for small strata as well
+    sizes = np.floor(np.bincount(groups) * fraction + rng.random(groups.max() + 1)).astype(np.int64)
+    positions = pd.Series(rng.random(len(groups))).groupby(groups).rank(method='first').to_numpy() - 1
+    return raw_data[positions < sizes[groups]]
+
+
+def get_standard_error_of_counts(counts, fraction):
+    """ return standard error of counts estimated as sample counts / fraction """
+    counts = np.asarray(counts, dtype=float)
+    return np.sqrt(counts * (1 - fraction)) / fraction
+
+
+def get_standard_error_of_mean(values, fraction):
+    """ return standard error of the mean of a sample drawn with given fraction """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return np.nan
+    return np.std(values, ddof=1) / np.sqrt(len(values)) * np.sqrt(1 - fraction)
+
+
+def get_standard_error_of_share(share, n, fraction):
+    """ return standard error of a share like the SLA quota measured on n sampled passengers """
+    if n == 0:
+        return np.nan
+    return np.sqrt(share * (1 - share) / n * (1 - fraction))
+
+
+def get_binned_standard_errors(values, bin_indices, bins, fraction):
+    """ return standard error of the mean of values per bin, bins with less than two values get NaN """
+    values = np.asarray(values, dtype=float)
+    bin_indices = np.asarray(bin_indices).astype(np.int64)
+    valid = (bin_indices >= 0) & (bin_indices < bins)
+    values, bin_indices = values[valid], bin_indices[valid]
+    n = np.bincount(bin_indices, minlength=bins)
+    sums = np.bincount(bin_indices, weights=values, minlength=bins)
+    squares = np.bincount(bin_indices, weights=values ** 2, minlength=bins)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (squares - sums ** 2 / n) / (n - 1)
+        errors = np.sqrt(np.clip(variance, 0, None) / n * (1 - fraction))
+    return np.where(n > 1, errors, np.nan)
@@ -0,0 +1,48 @@
+import numpy as np
+
+week_length = 60 * 60 * 24 * 7
+stages = [('b1', 'b2'), ('b2', 'b3'), ('b3', 'b4'), ('b4', 'b5')]
+
+
+def get_stage_names():
+    """ return names of all stages like b1-b2 """
+    return [start + '-' + end for start, end in stages]
+
+
+def compute_stage_metrics(df, time_step_size, number_of_weeks):
+    """ return occupancy, arrivals and departures per stage and time bin of the week as stage x time arrays """
+    steps = -(-week_length // time_step_size)
+    size = steps + 1
+    offsets = np.arange(len(stages)) * size
+
+    enter = df[[start + '_timestamp' for start, _ in stages]].to_numpy(dtype=float) % week_length
+    leave = df[[end + '_timestamp' for _, end in stages]].to_numpy(dtype=float) % week_length
+
+    # arrivals and departures counted in the bin they fall into
+    arrivals = np.bincount((np.floor(enter / time_step_size).astype(np.int64) + offsets).ravel(),
+                           minlength=len(stages) * size).reshape(len(stages), size)[:, :steps]
+    departures = np.bincount((np.floor(leave / time_step_size).astype(np.int64) + offsets).ravel(),
+                             minlength=len(stages) * size).reshape(len(stages), size)[:, :steps]
+
+    # occupancy at bin start i * time_step_size, passenger counted if enter <= t < leave
+    # +1 at first bin within the stay, -1 at first bin after it, stays over the end of the week also start at 0
+    first_in = np.ceil(enter / time_step_size).astype(np.int64) + offsets
+    first_out = np.ceil(leave / time_step_size).astype(np.int64) + offsets
+    wrapped = enter > leave
+    changes = (np.bincount(first_in.ravel(), minlength=len(stages) * size) -
+               np.bincount(first_out.ravel(), minlength=len(stages) * size) +
+               np.bincount(np.broadcast_to(offsets, wrapped.shape)[wrapped], minlength=len(stages) * size))
+    occupancy = np.cumsum(changes.reshape(len(stages), size), axis=1)[:, :steps]
+
+    return {'occupancy': occupancy / number_of_weeks, 'arrivals': arrivals / number_of_weeks,
+            'departures': departures / number_of_weeks}
+
+
+def compute_all_stage_metrics(dfs, time_step_size, number_of_weeks):
+    """ return stage metrics of every scenario grouped by metric """
+    metrics = {'occupancy': {}, 'arrivals': {}, 'departures': {}}
+    for key_element in dfs:
+        scenario_metrics = compute_stage_metrics(dfs[key_element], time_step_size, number_of_weeks)
+        for metric in metrics:
+            metrics[metric][key_element] = scenario_metrics[metric]
+    return metrics
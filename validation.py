@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import metrics_store
+
+checkpoints = ['b1', 'b2', 'b3', 'b4', 'b5']
+valid_types = ['economy', 'business']
+max_stay = 60 * 60 * 24  # longest plausible time between b1 and b5 in seconds
+quarantine_folder = 'Quarantine/'
+
+
+def get_rejections(raw_data):
+    """ return boolean mask per rule, True for every passenger violating the rule """
+    timestamps = raw_data[[c + '_timestamp' for c in checkpoints]].to_numpy(dtype=float)
+    diffs = np.diff(timestamps, axis=1)
+    rejections = {
+        # checkpoint without time, it would give NaN waiting times and time bins
+        'missing': np.isnan(timestamps).any(axis=1),
+        # checkpoints passed in wrong order, i.e. negative waiting time between two checkpoints
+        'order': (diffs < 0).any(axis=1),
+        # stays over several days
+        'max_stay': (timestamps[:, -1] - timestamps[:, 0]) > max_stay,
+    }
+    rejections.update(get_record_rejections(raw_data))
+    return rejections
+
+
+def get_record_rejections(raw_data):
+    """ return boolean mask per rule that needs no timestamp columns, for scripts working on the raw checkpoints """
+    rejections = {
+        # the same passenger listed more than once
+        'duplicate': raw_data.duplicated(subset=checkpoints + (['type'] if 'type' in raw_data else []),
+                                         keep='first').to_numpy(),
+    }
+    if 'type' in raw_data:
+        rejections['type'] = ~raw_data['type'].isin(valid_types).to_numpy()
+    return rejections
+
+
+def validate_data(raw_data, name, write_quarantine=True, rules=get_rejections):
+    """ remove implausible passengers from dataframe, save them in quarantine file and log count per rule """
+    rejections = rules(raw_data)
+    rejected = np.logical_or.reduce(list(rejections.values()))
+
+    for rule in rejections:
+        count = int(rejections[rule].sum())
+        metrics_store.add_statistic('validation', name, 'b1_b5', rule, count)
+        if count:
+            print('rejected ' + str(count) + ' passengers of ' + name + ' by rule ' + rule)
+
+    if write_quarantine and rejected.any():
+        quarantine = raw_data[rejected].copy()
+        quarantine['rejected_by'] = pd.DataFrame(rejections, index=raw_data.index)[rejected].apply(
+            lambda row: ','.join(row.index[row]), axis=1)
+        quarantine.to_csv(quarantine_folder + name + '.csv', sep=';', index=False)
+    return raw_data[~rejected]
@@ -1,11 +1,19 @@
-import time
 from datetime import datetime
 import statistics
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 from pathlib import Path
 from statistics import mean
+import metrics_store
+from ingestion import read_data, to_unix_time, from_unix_time, time_zone
+from histograms import get_histograms, compute_histograms, draw_histogram
+from validation import validate_data, quarantine_folder, max_stay, valid_types
+from stages import compute_all_stage_metrics, get_stage_names
+from sampling import draw_preview_sample, get_standard_error_of_counts, get_standard_error_of_mean, \
+    get_standard_error_of_share, get_binned_standard_errors
+from plot_queue import start_renderer, render, finish_rendering, cancel_rendering
+import lazy_backend
 
 data_files = {
     "historische Daten": 'sim_data/data.csv',
@@ -25,76 +33,114 @@ time_step_size_SLA = 60 * 30
 # for time window during which average waiting times is examined
 time_step_size_means = 60 * 10
 
+# for time bins of stage occupancy and throughput heatmaps
+time_step_size_stages = 60 * 15
+
 SLA_time = 60 * 30
 business_only = False
 
+# preview mode runs every metric on a stratified sample of each scenario and shows standard errors
+preview = False
+preview_fraction = 0.05
+preview_seed = 0
+
+# re-render only the waiting time histograms e.g. after re-styling, passenger data is only read if not cached yet
+only_waiting_times = False
+
+# parse every scenario once with polars and run the reports as lazy queries on it, not combined with preview
+use_lazy_backend = False
 
-def plot_and_save_waiting_times(datas_to_plot, title, x_label, y_label, filename, bins):
+
+def plot_and_save_waiting_times(histogram, title, x_label, y_label, filename):
     plt.rcParams.update({'figure.figsize': (7, 9), 'figure.dpi': 1000})
-    fig, axs = plt.subplots(len(list(datas_to_plot)), 1, sharex='all', sharey='all')
+    fig, axs = plt.subplots(len(list(histogram['counts'])), 1, sharex='all', sharey='all')
     plt.suptitle(title)
 
-    list_for_bins = []
-    for key_element in datas_to_plot:
-        list_for_bins = np.hstack((datas_to_plot[key_element], list_for_bins))
-    bins_np = np.histogram(list_for_bins, bins=bins)[1]
-
-    for i, key_element in enumerate(datas_to_plot):
+    for i, key_element in enumerate(histogram['counts']):
         axs[i].set(title=key_element, xlabel=x_label, ylabel=y_label)
-        axs[i].hist(datas_to_plot[key_element], bins_np)
+        draw_histogram(axs[i], histogram['edges'], histogram['counts'][key_element],
+                       histogram['errors'][key_element] if 'errors' in histogram else None)
 
     fig.tight_layout()
 
     folder = 'WaitingTimes/'
     plt.savefig(folder + filename)
+    plt.close(fig)
     # plt.show()
 
 
-def plot_and_save_passengers_in_system(datas_to_plot, x_label, y_label, title, filename):
+def plot_and_save_passengers_in_system(datas_to_plot, x_label, y_label, title, filename, errors=None):
     plt.rcParams.update({'figure.figsize': (7, 9), 'figure.dpi': 1000})
     fig, axs = plt.subplots(len(list(datas_to_plot)), 1, sharex='all', sharey='all')
     plt.suptitle(title)
     for i, key_element in enumerate(datas_to_plot):
         axs[i].set(title=key_element, xlabel=x_label, ylabel=y_label)
         axs[i].bar(range(0, 60 * 60 * 24 * 7, time_step_size_passengers), datas_to_plot[key_element],
-                   width=time_step_size_passengers)
+                   width=time_step_size_passengers, yerr=errors[key_element] if errors else None)
 
     fig.tight_layout()
 
     folder = 'CountPassengers/'
     plt.savefig(folder + filename)
+    plt.close(fig)
     # plt.show()
 
 
-def plot_and_save_average_waiting_times(datas_to_plot, x_label, y_label, title, filename):
+def plot_and_save_average_waiting_times(datas_to_plot, x_label, y_label, title, filename, errors=None):
     plt.rcParams.update({'figure.figsize': (7, 9), 'figure.dpi': 1000})
     fig, axs = plt.subplots(len(list(datas_to_plot)), 1, sharex='all', sharey='all')
     plt.suptitle(title)
     for i, key_element in enumerate(datas_to_plot):
         axs[i].set(title=key_element, xlabel=x_label, ylabel=y_label)
         axs[i].bar(range(0, 60 * 60 * 24 * 7, time_step_size_means), datas_to_plot[key_element],
-                   width=time_step_size_means)
+                   width=time_step_size_means, yerr=errors[key_element] if errors else None)
 
     fig.tight_layout()
 
     folder = 'AverageWaitingTimes/'
     plt.savefig(folder + filename)
+    plt.close(fig)
     # plt.show()
 
 
-def plot_and_save_sla(datas_to_plot, x_label, y_label, title, filename):
+def plot_and_save_sla(datas_to_plot, x_label, y_label, title, filename, errors=None):
     plt.rcParams.update({'figure.figsize': (7, 9), 'figure.dpi': 1000})
     fig, axs = plt.subplots(len(list(datas_to_plot)), 1, sharex='all', sharey='all')
     plt.suptitle(title)
     for i, key_element in enumerate(datas_to_plot):
         axs[i].set(title=key_element, xlabel=x_label, ylabel=y_label)
         axs[i].plot(range(0, 60 * 60 * 24 * 7, time_step_size_SLA), datas_to_plot[key_element])
+        if errors:
+            axs[i].fill_between(range(0, 60 * 60 * 24 * 7, time_step_size_SLA),
+                                np.array(datas_to_plot[key_element]) - errors[key_element],
+                                np.array(datas_to_plot[key_element]) + errors[key_element], alpha=0.3)
         axs[i].hlines(y=0.9, xmin=0, xmax=60 * 60 * 24 * 7, linewidth=2, color='r', label='SLA')
 
     fig.tight_layout()
 
     folder = 'SLA/'
     plt.savefig(folder + filename)
+    plt.close(fig)
+    # plt.show()
+
+
+def plot_and_save_stage_heatmap(datas_to_plot, x_label, y_label, title, filename, folder):
+    plt.rcParams.update({'figure.figsize': (7, 9), 'figure.dpi': 1000})
+    # constrained layout leaves room for the shared colorbar, which tight_layout does not
+    fig, axs = plt.subplots(len(list(datas_to_plot)), 1, sharex='all', sharey='all', constrained_layout=True)
+    plt.suptitle(title)
+    stage_names = get_stage_names()
+    upper = max(datas_to_plot[key_element].max() for key_element in datas_to_plot)
+    for i, key_element in enumerate(datas_to_plot):
+        axs[i].set(title=key_element, xlabel=x_label, ylabel=y_label)
+        image = axs[i].imshow(datas_to_plot[key_element], aspect='auto', interpolation='nearest', vmin=0, vmax=upper,
+                              extent=(0, 60 * 60 * 24 * 7, len(stage_names) - 0.5, -0.5))
+        axs[i].set_yticks(range(len(stage_names)))
+        axs[i].set_yticklabels(stage_names)
+    fig.colorbar(image, ax=list(axs))
+
+    plt.savefig(folder + filename)
+    plt.close(fig)
     # plt.show()
 
 
@@ -123,7 +169,7 @@ def add_timestamps(raw_data):
 def add_data_fields(raw_data):
     """ add extra columns like time for completion for every passenger """
     # add column with weekday number
-    raw_data['weekday'] = raw_data.apply(lambda row: datetime.fromtimestamp(row['b1_timestamp']).weekday(), axis=1)
+    raw_data['weekday'] = raw_data.apply(lambda row: from_unix_time(row['b1_timestamp']).weekday(), axis=1)
 
     # hour of arrival
     raw_data['arrival_time'] = raw_data.apply(lambda row: get_daytime(row), axis=1)
@@ -141,130 +187,224 @@ def add_data_fields(raw_data):
 
 def to_timestamp(row, column_name):
     """ returns timestamp from given row and given column name """
-    return time.mktime(datetime.strptime(row[column_name], '%d/%m/%Y %H:%M:%S').timetuple())
+    value = row[column_name]
+    # csv files contain strings, the cache of Excel exports already typed datetimes
+    if isinstance(value, str):
+        value = datetime.strptime(value, '%d/%m/%Y %H:%M:%S')
+    return to_unix_time(value)
 
 
 def get_daytime(s):
     """ return hour of day from given row and given column name """
-    return datetime.fromtimestamp(s['b1_timestamp']).hour
+    return from_unix_time(s['b1_timestamp']).hour
 
 
 def get_basic_analysis(data, type_name):
     """ do some basic data analysis from given dataset like max waiting time, min waiting time and mean waiting time"""
-    f = open("data_analysis_dump.txt", "a")
-    f.write('*' * 80 + '\n')
-    f.write('Basic analysis for ' + type_name + ':\n')
-    f.write('max: ' + str(max(data['b1_b5_diff']) / 60) + '\n')
-    f.write('min: ' + str(min(data['b1_b5_diff']) / 60) + '\n')
-    f.write('mean: ' + str(statistics.mean(data['b1_b5_diff']) / 60) + '\n')
-    f.write('standard deviation: ' + str(statistics.stdev(data['b1_b5_diff']) / 60) + '\n\n')
-    f.close()
-
-
-def plot_waiting_times(dfs, type_name):
-    """ plot distribution of waiting times between checkpoints"""
+    metrics_store.add_statistics('basic', type_name, 'b1_b5', data['b1_b5_diff'], scale=60)
+
+
+def compute_waiting_time_histograms(dfs, columns, bins, scale):
+    """ bin waiting times with the backend of given scenarios """
+    if lazy_backend.is_lazy(dfs):
+        return lazy_backend.compute_histograms(dfs, columns, bins, scale)
+    return compute_histograms(dfs, columns, bins, scale)
+
+
+def plot_waiting_times(get_dfs, type_name, renderer=None):
+    """ plot distribution of waiting times between checkpoints, get_dfs is only called if histograms are not cached """
+    columns = ['b' + str(i) + '_b' + str(i + 1) + '_diff' for i in range(1, 5)] + ['b1_b5_diff']
+    # counts of all scenarios and checkpoint pairs in minutes, binned once with shared edges
+    histograms = get_histograms(type_name, data_files, get_dfs, columns, bins=100, scale=60,
+                                compute=compute_waiting_time_histograms, settings=get_data_settings())
+    if preview:
+        # counts of the sample scaled up to the full data
+        histograms = {column: {'edges': histograms[column]['edges'],
+                               'counts': {key_element: counts / preview_fraction for key_element, counts in
+                                          histograms[column]['counts'].items()},
+                               'errors': {key_element: get_standard_error_of_counts(counts, preview_fraction)
+                                          for key_element, counts in histograms[column]['counts'].items()}}
+                      for column in columns}
     for i in range(1, 5):
-        df_diffs = {}
-        for key_element in dfs:
-            df_diffs[key_element] = dfs[key_element]['b' + str(i) + '_b' + str(i + 1) + '_diff']
-            df_diffs[key_element] = [x / 60 for x in df_diffs[key_element]]
-
-        plot_and_save_waiting_times(df_diffs,
-                                    title='Wartezeit zwischen ' + 'b' + str(i) + ' und b' + str(
-                                        i + 1) + ' für ' + type_name,
-                                    y_label='Anzahl', x_label='Wartezeit[min]',
-                                    filename='Wartezeit zwischen ' + 'b' + str(i) + ' und b' + str(
-                                        i + 1) + ' für ' + type_name + '.png', bins=100)
-    df_diffs = {}
-    for key_element in dfs:
-        df_diffs[key_element] = dfs[key_element]['b1_b5_diff']
-        df_diffs[key_element] = [x / 60 for x in df_diffs[key_element]]
-
-    plot_and_save_waiting_times(df_diffs, title='Wartezeit zwischen b1 und b5' + ' für ' + type_name,
-                                y_label='Anzahl', x_label='Wartezeit[min]',
-                                filename='Wartezeit zwischen b1 und b5 für ' + type_name + '.png', bins=100)
-
-
-def plot_passengers_in_system(dfs, type_name, number_of_weeks):
-    numbers_by_time = {}
-    # iterate over all seconds within a week with step size of one hour
-    for key_elements in dfs:
-        numbers_by_time[key_elements] = []
-        for i in range(0, 60 * 60 * 24 * 7, time_step_size_passengers):
-            numbers_by_time[key_elements].append(len(dfs[key_elements][
-                                                         (dfs[key_elements].b1_timestamp % (60 * 60 * 24 * 7) <= i) & (
-                                                                 dfs[key_elements].b5_timestamp % (
-                                                                 60 * 60 * 24 * 7) > i)]) // number_of_weeks)
+        render(renderer, plot_and_save_waiting_times, histograms['b' + str(i) + '_b' + str(i + 1) + '_diff'],
+               title='Wartezeit zwischen ' + 'b' + str(i) + ' und b' + str(i + 1) + ' für ' + type_name +
+               get_preview_note(),
+               y_label='Anzahl', x_label='Wartezeit[min]',
+               filename='Wartezeit zwischen ' + 'b' + str(i) + ' und b' + str(
+                   i + 1) + ' für ' + type_name + '.png')
 
-    plot_and_save_passengers_in_system(numbers_by_time, y_label='Anzahl', x_label='Systemzeit[s]',
-                                       title="Anzahl Passagiere in System für " + type_name,
-                                       filename=type_name + '.png')
+    render(renderer, plot_and_save_waiting_times, histograms['b1_b5_diff'],
+           title='Wartezeit zwischen b1 und b5' + ' für ' + type_name + get_preview_note(),
+           y_label='Anzahl', x_label='Wartezeit[min]',
+           filename='Wartezeit zwischen b1 und b5 für ' + type_name + '.png')
 
 
-def plot_average_waiting_times(dfs, type_name):
+def plot_passengers_in_system(dfs, type_name, number_of_weeks, renderer=None):
+    numbers_by_time = {}
+    errors_by_time = {}
+    if lazy_backend.is_lazy(dfs):
+        numbers_by_time = lazy_backend.get_passengers_in_system(dfs, time_step_size_passengers, number_of_weeks)
+    else:
+        # iterate over all seconds within a week with step size of one hour
+        for key_elements in dfs:
+            numbers_by_time[key_elements] = []
+            errors_by_time[key_elements] = []
+            for i in range(0, 60 * 60 * 24 * 7, time_step_size_passengers):
+                count = len(dfs[key_elements][(dfs[key_elements].b1_timestamp % (60 * 60 * 24 * 7) <= i) & (
+                        dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) > i)])
+                if preview:
+                    numbers_by_time[key_elements].append(count / preview_fraction / number_of_weeks)
+                    errors_by_time[key_elements].append(
+                        get_standard_error_of_counts(count, preview_fraction) / number_of_weeks)
+                else:
+                    numbers_by_time[key_elements].append(count // number_of_weeks)
+
+    render(renderer, plot_and_save_passengers_in_system, numbers_by_time, y_label='Anzahl', x_label='Systemzeit[s]',
+           title="Anzahl Passagiere in System für " + type_name + get_preview_note(),
+           filename=type_name + '.png', errors=errors_by_time if preview else None)
+
+
+def plot_average_waiting_times(dfs, type_name, renderer=None):
     means_by_time = {}
-    # iterate over all seconds within a week with step size of one hour
-    for key_elements in dfs:
-        means_by_time[key_elements] = []
-        for i in range(0, 60 * 60 * 24 * 7, time_step_size_means):
-            list_all_relevant_passengers = dfs[key_elements][
-                (dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) >= i) & (
-                        dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) < i + time_step_size_means)]['b1_b5_diff']
-            try:
-                means_by_time[key_elements].append(mean(list_all_relevant_passengers) / 60)
-            except statistics.StatisticsError:
-                # if not possible to calculate waiting time use last value
-                means_by_time[key_elements].append(means_by_time[key_elements][-1])
-
-    plot_and_save_average_waiting_times(means_by_time, y_label='Wartezeit[min]', x_label='Systemzeit[s]',
-                                        title="Durchschnittliche Wartezeit für " + type_name,
-                                        filename=type_name + '.png')
-
-
-def plot_SLA(dfs, type_name):
+    errors_by_time = {}
+    if lazy_backend.is_lazy(dfs):
+        means_by_time = lazy_backend.get_average_waiting_times(dfs, time_step_size_means)
+    else:
+        # iterate over all seconds within a week with step size of one hour
+        for key_elements in dfs:
+            means_by_time[key_elements] = []
+            for i in range(0, 60 * 60 * 24 * 7, time_step_size_means):
+                list_all_relevant_passengers = dfs[key_elements][
+                    (dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) >= i) & (
+                            dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) < i + time_step_size_means)][
+                    'b1_b5_diff']
+                try:
+                    means_by_time[key_elements].append(mean(list_all_relevant_passengers) / 60)
+                except statistics.StatisticsError:
+                    # if not possible to calculate waiting time use last value, small preview samples can leave the
+                    # first bins empty as well
+                    means_by_time[key_elements].append(
+                        means_by_time[key_elements][-1] if means_by_time[key_elements] else 0)
+            if preview:
+                errors_by_time[key_elements] = get_binned_standard_errors(
+                    dfs[key_elements].b1_b5_diff / 60,
+                    (dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7)) // time_step_size_means,
+                    len(means_by_time[key_elements]), preview_fraction)
+
+    render(renderer, plot_and_save_average_waiting_times, means_by_time, y_label='Wartezeit[min]',
+           x_label='Systemzeit[s]',
+           title="Durchschnittliche Wartezeit für " + type_name + get_preview_note(),
+           filename=type_name + '.png', errors=errors_by_time if preview else None)
+
+
+def plot_SLA(dfs, type_name, renderer=None):
     numbers_by_time = {}
-    # iterate over all seconds within a week with step size of one hour
-    for key_elements in dfs:
-        numbers_by_time[key_elements] = []
-        for i in range(0, 60 * 60 * 24 * 7, time_step_size_SLA):
-            # percentage of passengers within SLA
-            try:
-                numbers_by_time[key_elements].append(len(dfs[key_elements][
-                                                             (dfs[key_elements].b5_timestamp % (
-                                                                     60 * 60 * 24 * 7) > i) & (
-                                                                     dfs[key_elements].b5_timestamp % (
-                                                                     60 * 60 * 24 * 7) <= i + time_step_size_SLA) & (
-                                                                     dfs[key_elements].b1_b5_diff <= SLA_time)]) / len(
-                    dfs[key_elements][(dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) > i) & (
-                            dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) <= i + time_step_size_SLA)]))
-            except ZeroDivisionError:
-                numbers_by_time[key_elements].append(0)
-    plot_and_save_sla(numbers_by_time, y_label='Anzahl', x_label='Systemzeit[s]',
-                      title="SLA für " + type_name,
-                      filename=type_name + '.png')
+    errors_by_time = {}
+    if lazy_backend.is_lazy(dfs):
+        numbers_by_time = lazy_backend.get_sla_by_time(dfs, time_step_size_SLA, SLA_time)
+    else:
+        # iterate over all seconds within a week with step size of one hour
+        for key_elements in dfs:
+            numbers_by_time[key_elements] = []
+            for i in range(0, 60 * 60 * 24 * 7, time_step_size_SLA):
+                # percentage of passengers within SLA
+                try:
+                    numbers_by_time[key_elements].append(len(dfs[key_elements][
+                        (dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) > i) & (
+                                dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) <= i + time_step_size_SLA) & (
+                                dfs[key_elements].b1_b5_diff <= SLA_time)]) / len(
+                        dfs[key_elements][(dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) > i) & (
+                                dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7) <= i + time_step_size_SLA)]))
+                except ZeroDivisionError:
+                    numbers_by_time[key_elements].append(0)
+            if preview:
+                # bins are (i, i + time_step_size_SLA], b5 exactly at the start of the week belongs to no bin
+                errors_by_time[key_elements] = np.nan_to_num(get_binned_standard_errors(
+                    dfs[key_elements].b1_b5_diff <= SLA_time,
+                    np.ceil((dfs[key_elements].b5_timestamp % (60 * 60 * 24 * 7)) / time_step_size_SLA).astype(
+                        int) - 1,
+                    len(numbers_by_time[key_elements]), preview_fraction))
+    render(renderer, plot_and_save_sla, numbers_by_time, y_label='Anzahl', x_label='Systemzeit[s]',
+           title="SLA für " + type_name + get_preview_note(),
+           filename=type_name + '.png', errors=errors_by_time if preview else None)
+
+
+def plot_stage_heatmaps(dfs, type_name, number_of_weeks, renderer=None):
+    """ plot occupancy, arrivals and departures of every stage by time of the week to find bottlenecks """
+    # counts of a preview sample are scaled up to the full data
+    metrics = compute_all_stage_metrics(lazy_backend.get_stage_frames(dfs) if lazy_backend.is_lazy(dfs) else dfs,
+                                        time_step_size_stages,
+                                        number_of_weeks * preview_fraction if preview else number_of_weeks)
+    titles = {'occupancy': 'Anzahl Passagiere pro Abschnitt für ',
+              'arrivals': 'Ankünfte pro Abschnitt für ',
+              'departures': 'Abgänge pro Abschnitt für '}
+    for metric in metrics:
+        render(renderer, plot_and_save_stage_heatmap, metrics[metric], y_label='Abschnitt', x_label='Systemzeit[s]',
+               title=titles[metric] + type_name + get_preview_note(), filename=metric + ' ' + type_name + '.png',
+               folder='StageHeatmaps/')
 
 
 def analyze_waiting_times(df, type_name):
     """ get data analysis for waiting time between checkpoints"""
-    f = open("waiting_times.txt", "a")
-    f.write('*' * 80 + '\n')
-    f.write('Wartezeiten fuer ' + type_name + ':\n')
+    if lazy_backend.is_lazy_frame(df):
+        for column, values in lazy_backend.get_waiting_time_statistics(df).items():
+            for name in ['min', 'max', 'mean', 'stdev']:
+                metrics_store.add_statistic('waiting_times', type_name, column[:-len('_diff')], name, values[name])
+        return
     for i in range(1, 5):
-        df_diff = df['b' + str(i) + '_b' + str(i + 1) + '_diff']
-        df_diff = [x / 60 for x in df_diff]
-        f.write('zwischen ' + 'b' + str(i) + ' und b' + str(i + 1) + '\n')
-        f.write('min: ' + str(min(df_diff)) + '\n')
-        f.write('max: ' + str(max(df_diff)) + '\n')
-        f.write('Durchschnitt: ' + str(statistics.mean(df_diff)) + '\n')
-        f.write('Standardabweichung: ' + str(statistics.stdev(df_diff)) + '\n\n')
-    df_diff = df['b1''_b5''_diff']
-    df_diff = [x / 60 for x in df_diff]
-    f.write('zwischen ' + 'b1 und b5''\n')
-    f.write('min: ' + str(min(df_diff)) + '\n')
-    f.write('max: ' + str(max(df_diff)) + '\n')
-    f.write('Durchschnitt: ' + str(statistics.mean(df_diff)) + '\n')
-    f.write('Standardabweichung: ' + str(statistics.stdev(df_diff)) + '\n\n')
-    f.close()
+        metrics_store.add_statistics('waiting_times', type_name, 'b' + str(i) + '_b' + str(i + 1),
+                                     df['b' + str(i) + '_b' + str(i + 1) + '_diff'], scale=60)
+        if preview:
+            metrics_store.add_statistic('waiting_times', type_name, 'b' + str(i) + '_b' + str(i + 1), 'mean_se',
+                                        get_standard_error_of_mean(df['b' + str(i) + '_b' + str(i + 1) + '_diff'] / 60,
+                                                                   preview_fraction))
+    metrics_store.add_statistics('waiting_times', type_name, 'b1_b5', df['b1_b5_diff'], scale=60)
+    if preview:
+        metrics_store.add_statistic('waiting_times', type_name, 'b1_b5', 'mean_se',
+                                    get_standard_error_of_mean(df['b1_b5_diff'] / 60, preview_fraction))
+
+
+def get_sla(df):
+    """ return share of passengers within SLA time and number of passengers """
+    if lazy_backend.is_lazy_frame(df):
+        return lazy_backend.get_sla(df, SLA_time)
+    return len(df[df.b1_b5_diff <= SLA_time]) / len(df), len(df)
+
+
+def get_data_settings():
+    """ return settings the prepared passenger data depends on besides the input files """
+    return {'business_only': business_only, 'preview': [preview_fraction, preview_seed] if preview else False,
+            'max_stay': max_stay, 'valid_types': valid_types, 'time_zone': time_zone}
+
+
+def load_data():
+    """ read, clean, validate and extend passenger data of all scenarios """
+    all_df = {}
+    lazy = use_lazy_backend and not preview
+    for key in data_files:
+        all_df[key] = lazy_backend.scan_data(data_files[key]) if lazy else read_data(data_files[key])
+
+    if lazy:
+        # raw data of all scenarios is parsed once, every report below only reads the columns it needs
+        all_df = lazy_backend.materialize({key: lazy_backend.prepare_data(all_df[key], business_only)
+                                           for key in all_df})
+    for key in all_df:
+        if lazy:
+            all_df[key] = lazy_backend.validate_data(all_df[key], key)
+            continue
+        all_df[key] = cleanup_data(all_df[key])
+        if preview:
+            all_df[key] = draw_preview_sample(all_df[key], preview_fraction, preview_seed)
+        all_df[key] = add_timestamps(all_df[key])
+        # rejections of a sample must not replace the quarantine file of the full data
+        all_df[key] = validate_data(all_df[key], key, write_quarantine=not preview)
+        all_df[key] = add_data_fields(all_df[key])
+    return all_df
+
+
+def get_preview_note():
+    """ return note for plot titles whether plot is based on a preview sample """
+    return ' (Vorschau, ' + str(preview_fraction * 100) + '% Stichprobe)' if preview else ''
 
 
 def do_stuff(df, time_name):
@@ -282,40 +422,58 @@ def do_stuff_single_day(df):
 
 
 if __name__ == '__main__':
+    Path("WaitingTimes/").mkdir(parents=True, exist_ok=True)
+    Path(quarantine_folder).mkdir(parents=True, exist_ok=True)
+    if only_waiting_times:
+        plot_waiting_times(load_data, 'alle')
+        sys.exit()
+
     # clear output txt files
     open("waiting_times.txt", "w").close()
+    conn = metrics_store.connect()
+    run_id = metrics_store.start_run(conn, 'waiting_times_compare', preview, preview_fraction)
 
-    Path("WaitingTimes/").mkdir(parents=True, exist_ok=True)
     Path("CountPassengers/").mkdir(parents=True, exist_ok=True)
     Path("AverageWaitingTimes/").mkdir(parents=True, exist_ok=True)
     Path("SLA/").mkdir(parents=True, exist_ok=True)
-    all_df = {}
-    for key in data_files:
-        all_df[key] = pd.read_csv(data_files[key], sep=';')
-
-    for key in all_df:
-        all_df[key] = cleanup_data(all_df[key])
-        all_df[key] = add_timestamps(all_df[key])
-        all_df[key] = add_data_fields(all_df[key])
-
-    print('plotting waiting means...')
-    plot_average_waiting_times(all_df, 'alle')
-    print('plotting waiting times...')
-    plot_waiting_times(all_df, 'alle')
-    print('plotting passenger counts...')
-    plot_passengers_in_system(all_df, 'alle', 3)
-    print('plotting SLA...')
-    plot_SLA(all_df, 'alle')
-
-    print('analyzing data...')
-    for key in all_df:
-        analyze_waiting_times(all_df[key], key)
-
-    outfile = open("waiting_times.txt", "a")
-    outfile.write('\n\n')
-    outfile.write('*' * 80 + '\n')
-    for key in all_df:
-        outfile.write('SLA ' + key + ':' + str(len(all_df[key][all_df[key].b1_b5_diff <= SLA_time]) / len(all_df[key]))[
-                                           0: 8] + '\n')
-        print('SLA ' + key + ':', str(len(all_df[key][all_df[key].b1_b5_diff <= SLA_time]) / len(all_df[key]))[0: 8])
-    outfile.close()
+    Path("StageHeatmaps/").mkdir(parents=True, exist_ok=True)
+    all_df = load_data()
+
+    # metrics are computed here while background processes render the queued plots
+    renderer = start_renderer()
+    try:
+        print('plotting waiting means...')
+        plot_average_waiting_times(all_df, 'alle', renderer)
+        print('plotting waiting times...')
+        plot_waiting_times(lambda: all_df, 'alle', renderer)
+        print('plotting passenger counts...')
+        plot_passengers_in_system(all_df, 'alle', 3, renderer)
+        print('plotting SLA...')
+        plot_SLA(all_df, 'alle', renderer)
+        print('plotting stage heatmaps...')
+        plot_stage_heatmaps(all_df, 'alle', 3, renderer)
+
+        print('analyzing data...')
+        for key in all_df:
+            analyze_waiting_times(all_df[key], key)
+
+        for key in all_df:
+            sla, count = get_sla(all_df[key])
+            metrics_store.add_statistic('sla', key, 'b1_b5', 'sla', sla)
+            if preview:
+                sla_se = get_standard_error_of_share(sla, count, preview_fraction)
+                metrics_store.add_statistic('sla', key, 'b1_b5', 'sla_se', sla_se)
+                print('SLA ' + key + ':', str(sla)[0: 8], '+-', str(sla_se)[0: 8])
+            else:
+                print('SLA ' + key + ':', str(sla)[0: 8])
+
+        print('waiting for plots...')
+        finish_rendering(renderer)
+    finally:
+        # a failed metric or plot must not leave the queued plots rendering
+        cancel_rendering(renderer)
+
+    metrics_store.flush(conn, run_id)
+    metrics_store.render_waiting_times(conn, run_id, "waiting_times.txt")
+    metrics_store.render_sla(conn, run_id, "waiting_times.txt")
+    conn.close()